@@ -1,11 +1,47 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import httpx
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, field_validator
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+import aiohttp
+import asyncio
+import logging
 import math
+import numpy as np
+import orjson
 import re
-
-app = FastAPI(title="LogiQ Quantum Routing API")
+import time
+
+logger = logging.getLogger("logiq")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for Nominatim/OSRM/Overpass so connections are reused
+    app.state.http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=200, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=30),
+        headers=HEADERS,
+    )
+    app.state.toll_index = None
+    refresher = asyncio.create_task(refresh_toll_index())
+    yield
+    refresher.cancel()
+    await app.state.http.close()
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson; NumPy arrays serialize natively."""
+
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+app = FastAPI(
+    title="LogiQ Quantum Routing API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +56,32 @@ OVERPASS = "https://overpass-api.de/api/interpreter"
 
 HEADERS = {"User-Agent": "LogiQ-Quantum-Routing"}
 
+# reverse_geocode's fallback when Nominatim has no display_name
+UNKNOWN_LOCATION = "Unknown location"
+
+# Caps Nominatim requests in flight when fanning out with asyncio.gather;
+# this bounds concurrency only, the request rate is NOMINATIM_MIN_INTERVAL_S
+NOMINATIM_CONCURRENCY = 5
+# Minimum gap between Nominatim request starts. The public instance's usage
+# policy allows at most 1 request/s; a self-hosted instance can lower this.
+NOMINATIM_MIN_INTERVAL_S = 1.0
+
+# Toll nodes for this (south, west, north, east) box are kept in memory and
+# refreshed daily; routes outside it fall back to a live Overpass query.
+TOLL_REGION = (6.5, 68.0, 37.5, 97.5)  # India
+TOLL_REFRESH_SECONDS = 24 * 3600
+TOLL_RETRY_SECONDS = 15 * 60
+# A reload with fewer nodes than this share of the current index is treated
+# as truncated and thrown away
+TOLL_MIN_RELOAD_RATIO = 0.8
+
+# A toll counts as on the route within this distance of the path
+TOLL_MATCH_THRESHOLD_M = 150
+# RDP tolerance for the decimated route used to shortlist tolls
+RDP_EPSILON_M = 50
+# Route segments are bucketed into square cells this wide (Mercator metres)
+SEGMENT_GRID_M = 2000
+
 # ================= FUEL DATA =================
 CITY_FUEL_PRICES = {
     "Delhi": 96.7,
@@ -32,45 +94,37 @@ CITY_FUEL_PRICES = {
 
 DEFAULT_FUEL_PRICE = 100.0
 
+# One case-insensitive alternation over all known cities, scanned once per address
+CITY_RE = re.compile("|".join(re.escape(c) for c in CITY_FUEL_PRICES), re.IGNORECASE)
+CITY_BY_LOWER = {c.lower(): c for c in CITY_FUEL_PRICES}
+
+CC_RE = re.compile(r"\d+")
+DEFAULT_CC = 4000
+
 # ================= MILEAGE LOGIC (VAN / TRUCK / LORRY) =================
+# vehicle -> (CC upper bounds, km/l for each band); a CC equal to a bound
+# falls in the lower band
+MILEAGE_TABLE = {
+    "van": ([2000, 3000], [12, 9, 7]),          # 🚐 VAN
+    "truck": ([4000, 6000], [6, 4.5, 3.5]),     # 🚚 TRUCK (medium)
+    "lorry": ([6000, 9000], [4, 3, 2.5]),       # 🚛 LORRY (heavy)
+}
+DEFAULT_MILEAGE = 5
+
 def estimate_mileage(vehicle: str, cc: int):
-    v = vehicle.lower()
-
-    # 🚐 VAN
-    if v == "van":
-        if cc <= 2000:
-            return 12
-        elif cc <= 3000:
-            return 9
-        else:
-            return 7
-
-    # 🚚 TRUCK (medium)
-    if v == "truck":
-        if cc <= 4000:
-            return 6
-        elif cc <= 6000:
-            return 4.5
-        else:
-            return 3.5
-
-    # 🚛 LORRY (heavy)
-    if v == "lorry":
-        if cc <= 6000:
-            return 4
-        elif cc <= 9000:
-            return 3
-        else:
-            return 2.5
-
-    # Fallback
-    return 5
+    bands = MILEAGE_TABLE.get(vehicle.lower())
+    if bands is None:
+        return DEFAULT_MILEAGE
+    bounds, mileages = bands
+    return mileages[bisect_left(bounds, cc)]
 
 def extract_city(address: str):
     if not address:
         return None
-    for city in CITY_FUEL_PRICES.keys():
-        if city.lower() in address.lower():
+    found = {m.lower() for m in CITY_RE.findall(address)}
+    # Ties go to the city listed first, as before
+    for lower, city in CITY_BY_LOWER.items():
+        if lower in found:
             return city
     return None
 
@@ -83,17 +137,125 @@ class RouteRequest(BaseModel):
     start: LatLng
     end: LatLng
     vehicle: str
-    cc: str  # comes like "1500 CC", "7000 CC", etc.
+    cc: int = Field(ge=0)
+
+    @field_validator("cc", mode="before")
+    @classmethod
+    def parse_cc(cls, value):
+        # The frontend sends strings like "1500 CC", "7000 CC", etc.
+        if isinstance(value, str):
+            match = CC_RE.search(value)
+            return int(match.group()) if match else DEFAULT_CC
+        return value
+
+# ================= CACHE =================
+class LRUCache:
+    """Bounded LRU mapping; entries older than ``ttl`` seconds are dropped.
+
+    ``maxsize`` caps the summed ``weigh(value)`` of all entries, which is one
+    per entry by default; pass a byte estimate to bound the cache by memory.
+    """
+
+    def __init__(self, maxsize, ttl=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh or (lambda value: 1)
+        self._data = OrderedDict()
+        self._total = 0
+
+    def get(self, key):
+        if key not in self._data:
+            return None
+        expires, weight, value = self._data[key]
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            self._total -= weight
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        weight = self.weigh(value)
+        if key in self._data:
+            self._total -= self._data[key][1]
+        self._data[key] = (expires, weight, value)
+        self._data.move_to_end(key)
+        self._total += weight
+        while self._total > self.maxsize:
+            _, (_, weight, _) = self._data.popitem(last=False)
+            self._total -= weight
+
+class RequestSpacer:
+    """Spaces request starts at least ``interval`` seconds apart."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_start = 0.0
+
+    async def wait(self):
+        # Claim the next free slot before sleeping, so concurrent waiters
+        # queue up one interval apart instead of all waking at once
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+# Rounded to 4 decimals (~10 m), close enough to share an address
+GEOCODE_CACHE = LRUCache(maxsize=50_000)
+NOMINATIM_SEMAPHORE = asyncio.Semaphore(NOMINATIM_CONCURRENCY)
+NOMINATIM_SPACER = RequestSpacer(NOMINATIM_MIN_INTERVAL_S)
+
+# Whole /routes responses and OSRM routes, keyed on endpoints rounded to ~10 m
+# and bounded by an estimate of their size in bytes. A cached response shares
+# its polyline array with the cached route rather than copying it.
+ROUTE_CACHE_BYTES = 64 * 1024 * 1024
+CACHE_ENTRY_OVERHEAD = 1024  # dicts, keys and short strings per entry/toll
+
+def route_nbytes(route):
+    return route.polyline.nbytes + CACHE_ENTRY_OVERHEAD
+
+def response_nbytes(response):
+    tolls = len(response["toll_points"])
+    return response["quantum"]["polyline"].nbytes + CACHE_ENTRY_OVERHEAD * (tolls + 3)
+
+ROUTE_RESPONSE_CACHE = LRUCache(maxsize=ROUTE_CACHE_BYTES, ttl=3600, weigh=response_nbytes)
+OSRM_ROUTE_CACHE = LRUCache(maxsize=ROUTE_CACHE_BYTES, ttl=3600, weigh=route_nbytes)
+
+# In-flight lookups by cache key, so concurrent requests share one HTTP call
+GEOCODE_INFLIGHT = {}
 
 # ================= GEO HELPERS =================
-async def reverse_geocode(lat, lng):
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(
+async def _fetch_address(key, lat, lng):
+    async with NOMINATIM_SEMAPHORE:
+        await NOMINATIM_SPACER.wait()
+        async with app.state.http.get(
             f"{NOMINATIM}/reverse",
             params={"lat": lat, "lon": lng, "format": "json"},
-            headers=HEADERS
-        )
-        return r.json().get("display_name", "Unknown location")
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as r:
+            data = orjson.loads(await r.read())
+    address = data.get("display_name")
+
+    if address is None:
+        return UNKNOWN_LOCATION
+    GEOCODE_CACHE.set(key, address)
+    return address
+
+async def reverse_geocode(lat, lng):
+    key = (round(lat, 4), round(lng, 4))
+    cached = GEOCODE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    task = GEOCODE_INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_address(key, lat, lng))
+        GEOCODE_INFLIGHT[key] = task
+        task.add_done_callback(lambda _: GEOCODE_INFLIGHT.pop(key, None))
+    # Shielded so one cancelled caller doesn't cancel the lookup for the rest
+    return await asyncio.shield(task)
 
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371000
@@ -103,154 +265,439 @@ def haversine(lat1, lon1, lat2, lon2):
     a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
     return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-def point_line_distance(toll_lat, toll_lng, lat1, lng1, lat2, lng2):
+def mercator(lat, lng):
+    """Project degrees to Web Mercator metres (works on scalars and arrays).
+
+    Mercator is conformal: near latitude ``lat`` true distances are the
+    projected ones times cos(lat), so on-route checks need no per-segment trig.
+    """
     R = 6371000
-    x = math.radians(toll_lng - lng1) * math.cos(math.radians((toll_lat + lat1) / 2))
-    y = math.radians(toll_lat - lat1)
-    x2 = math.radians(lng2 - lng1) * math.cos(math.radians((lat2 + lat1) / 2))
-    y2 = math.radians(lat2 - lat1)
-    dot = x * x2 + y * y2
-    len_sq = x2 * x2 + y2 * y2
-    param = dot / len_sq if len_sq != 0 else -1
-    if param < 0:
-        xx, yy = 0, 0
-    elif param > 1:
-        xx, yy = x2, y2
-    else:
-        xx, yy = param * x2, param * y2
-    dx = x - xx
-    dy = y - yy
-    return R * math.sqrt(dx * dx + dy * dy)
-
-def is_toll_on_route(toll_lat, toll_lng, polyline, threshold=150):
-    for i in range(len(polyline) - 1):
-        lat1, lng1 = polyline[i]
-        lat2, lng2 = polyline[i + 1]
-        dist = point_line_distance(toll_lat, toll_lng, lat1, lng1, lat2, lng2)
-        if dist <= threshold:
-            return True
-    return False
+    x = R * np.radians(lng)
+    y = R * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+def segment_dist_sq(px, py, dx, dy, len_sq):
+    """Squared distance from offsets (px, py) to segments (0, 0)-(dx, dy)."""
+    # Zero-length segments clamp to their start point
+    param = np.divide(
+        px * dx + py * dy, len_sq,
+        out=np.zeros_like(len_sq), where=len_sq != 0
+    )
+    param = np.clip(param, 0, 1)
+    ex = px - param * dx
+    ey = py - param * dy
+    return ex * ex + ey * ey
+
+def simplify_polyline(polyline, epsilon_m=RDP_EPSILON_M):
+    """Ramer-Douglas-Peucker decimation of a [lat, lng] array.
+
+    Every dropped point stays within ``epsilon_m`` true metres of the result.
+    """
+    n = len(polyline)
+    if n < 3:
+        return polyline
+
+    # Same projection as toll matching; scaled at the lowest latitude, where
+    # Mercator stretches least, the tolerance is never exceeded elsewhere
+    x, y = mercator(polyline[:, 0], polyline[:, 1])
+    min_lat = np.abs(polyline[:, 0]).min()
+    epsilon_m = epsilon_m / math.cos(math.radians(min_lat))
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[i + 1:j] - x[i], y[i + 1:j] - y[i]
+        # Distance to the chord segment, not its infinite line, so the apex
+        # of an out-and-back stretch is never dropped
+        dist_sq = segment_dist_sq(px, py, dx, dy, np.full_like(px, dx * dx + dy * dy))
+        k = int(np.argmax(dist_sq))
+        if dist_sq[k] > epsilon_m * epsilon_m:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return polyline[keep]
+
+class RouteSegments(NamedTuple):
+    """Per-segment geometry as parallel arrays in Mercator metres."""
+    x1: np.ndarray
+    y1: np.ndarray
+    dx: np.ndarray
+    dy: np.ndarray
+    len_sq: np.ndarray
+    grid: dict  # (col, row) cell -> indices of segments within reach of it
+
+def build_segment_grid(x, y, pad):
+    x1, y1 = x[:-1], y[:-1]
+    dx, dy = x[1:] - x1, y[1:] - y1
+
+    # Split segments into pieces no longer than a cell, so a long RDP chord
+    # lands only in the cells along it rather than its whole bounding box
+    pieces = np.maximum(np.ceil(np.hypot(dx, dy) / SEGMENT_GRID_M), 1).astype(int)
+    seg = np.repeat(np.arange(len(dx)), pieces)
+    step = np.arange(len(seg)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    t0 = step / pieces[seg]
+    t1 = (step + 1) / pieces[seg]
+    ax, ay = x1[seg] + t0 * dx[seg], y1[seg] + t0 * dy[seg]
+    bx, by = x1[seg] + t1 * dx[seg], y1[seg] + t1 * dy[seg]
+    cols0 = np.floor((np.minimum(ax, bx) - pad) / SEGMENT_GRID_M).astype(int)
+    cols1 = np.floor((np.maximum(ax, bx) + pad) / SEGMENT_GRID_M).astype(int)
+    rows0 = np.floor((np.minimum(ay, by) - pad) / SEGMENT_GRID_M).astype(int)
+    rows1 = np.floor((np.maximum(ay, by) + pad) / SEGMENT_GRID_M).astype(int)
+
+    # Each padded piece covers only a few cells per axis
+    entries = []
+    for dc in range(int((cols1 - cols0).max()) + 1):
+        for dr in range(int((rows1 - rows0).max()) + 1):
+            ok = (cols0 + dc <= cols1) & (rows0 + dr <= rows1)
+            entries.append(np.column_stack([cols0[ok] + dc, rows0[ok] + dr, seg[ok]]))
+
+    # Group unique (col, row, segment) entries by cell
+    entries = np.unique(np.concatenate(entries), axis=0)
+    cell_change = (np.diff(entries[:, 0]) != 0) | (np.diff(entries[:, 1]) != 0)
+    starts = np.concatenate([[0], np.flatnonzero(cell_change) + 1])
+    groups = np.split(entries[:, 2], starts[1:])
+    return {
+        (int(entries[i, 0]), int(entries[i, 1])): idx
+        for i, idx in zip(starts, groups)
+    }
+
+def build_route_segments(polyline, threshold=TOLL_MATCH_THRESHOLD_M):
+    """Project the route once so every toll check reuses it.
+
+    ``threshold`` is the largest match distance the segment grid must cover.
+    """
+    x, y = mercator(polyline[:, 0], polyline[:, 1])
+    dx = x[1:] - x[:-1]
+    dy = y[1:] - y[:-1]
+    len_sq = dx * dx + dy * dy
+    grid = {}
+    if len(len_sq):
+        # Mercator stretches distances by 1/cos(lat); pad for the worst point
+        max_lat = np.abs(polyline[:, 0]).max()
+        pad = threshold / max(math.cos(math.radians(max_lat)), 0.01)
+        grid = build_segment_grid(x, y, pad)
+    return RouteSegments(x[:-1], y[:-1], dx, dy, len_sq, grid)
+
+def tolls_on_route(toll_lats, toll_lngs, segments, threshold=TOLL_MATCH_THRESHOLD_M):
+    """Boolean mask of which tolls lie within ``threshold`` metres of the route.
+
+    Every (toll, candidate segment) pair is evaluated in one vectorized pass.
+    """
+    toll_lats = np.asarray(toll_lats, dtype=np.float64)
+    toll_lngs = np.asarray(toll_lngs, dtype=np.float64)
+    mask = np.zeros(len(toll_lats), dtype=bool)
+    if not len(toll_lats) or not segments.grid:
+        return mask
+
+    tx, ty = mercator(toll_lats, toll_lngs)
+    cols = np.floor(tx / SEGMENT_GRID_M).astype(int)
+    rows = np.floor(ty / SEGMENT_GRID_M).astype(int)
+    toll_idx, seg_idx = [], []
+    for i, cell in enumerate(zip(cols, rows)):
+        idx = segments.grid.get(cell)
+        if idx is not None:
+            toll_idx.append(np.full(len(idx), i))
+            seg_idx.append(idx)
+    if not seg_idx:
+        return mask
+    toll_idx = np.concatenate(toll_idx)
+    seg_idx = np.concatenate(seg_idx)
+
+    dx, dy, len_sq = segments.dx[seg_idx], segments.dy[seg_idx], segments.len_sq[seg_idx]
+    px = tx[toll_idx] - segments.x1[seg_idx]
+    py = ty[toll_idx] - segments.y1[seg_idx]
+    limit = threshold / np.cos(np.radians(toll_lats))
+    hit = segment_dist_sq(px, py, dx, dy, len_sq) <= limit[toll_idx] ** 2
+    mask[toll_idx[hit]] = True
+    return mask
+
+def tolls_near_polyline(toll_coords, polyline, threshold=TOLL_MATCH_THRESHOLD_M):
+    """Exact check of a few [lat, lng] tolls against every segment of a route."""
+    x, y = mercator(polyline[:, 0], polyline[:, 1])
+    x1, y1 = x[:-1], y[:-1]
+    dx, dy = x[1:] - x1, y[1:] - y1
+    len_sq = dx * dx + dy * dy
+    tx, ty = mercator(toll_coords[:, 0], toll_coords[:, 1])
+    limit = threshold / np.cos(np.radians(toll_coords[:, 0]))
+    return np.array([
+        bool(np.any(segment_dist_sq(tx[i] - x1, ty[i] - y1, dx, dy, len_sq) <= limit[i] ** 2))
+        for i in range(len(toll_coords))
+    ], dtype=bool)
 
 def dedupe_nearby_tolls(points, threshold_m=300):
+    if not points:
+        return []
+
+    # Grid cells at least threshold_m wide, so any toll closer than the
+    # threshold lives in the same or an adjacent cell.
+    R = 6371000
+    max_lat = max(abs(p["lat"]) for p in points)
+    cell_lat = math.degrees(threshold_m / R)
+    cell_lng = cell_lat / max(math.cos(math.radians(max_lat)), 0.01)
+
     result = []
+    grid = {}
     for p in points:
-        keep = True
-        for q in result:
-            d = haversine(p["lat"], p["lng"], q["lat"], q["lng"])
-            if d < threshold_m:
-                keep = False
-                break
+        ci = math.floor(p["lat"] / cell_lat)
+        cj = math.floor(p["lng"] / cell_lng)
+        keep = not any(
+            haversine(p["lat"], p["lng"], q["lat"], q["lng"]) < threshold_m
+            for di in (-1, 0, 1)
+            for dj in (-1, 0, 1)
+            for q in grid.get((ci + di, cj + dj), ())
+        )
         if keep:
             result.append(p)
+            grid.setdefault((ci, cj), []).append(p)
     return result
 
-async def fetch_tolls_along_route(polyline):
-    lats = [p[0] for p in polyline]
-    lngs = [p[1] for p in polyline]
-    bbox = (min(lats), min(lngs), max(lats), max(lngs))
-
-    query = f"""
-    [out:json];
+def overpass_toll_query(bbox, timeout=None):
+    b = ",".join(str(v) for v in bbox)
+    # Without a timeout Overpass applies its own default; a short one only
+    # makes a busy server cut the toll list off partway
+    settings = "[out:json]" if timeout is None else f"[out:json][timeout:{timeout}]"
+    # "skel" drops tags and metadata; only node coordinates are needed
+    return f"""
+    {settings};
     (
-      node["barrier"="toll_booth"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-      node["highway"="toll_gantry"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-      node["amenity"="toll_plaza"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
+      node["barrier"="toll_booth"]({b});
+      node["highway"="toll_gantry"]({b});
+      node["amenity"="toll_plaza"]({b});
     );
-    out body;
+    out skel qt;
+    """
+
+def parse_toll_coords(body):
+    """Overpass JSON body -> (n, 2) float64 array of [lat, lng] toll nodes.
+
+    Raises ValueError when Overpass flags the result as incomplete.
+    """
+    data = orjson.loads(body)
+    # Overpass answers a timed-out or out-of-memory query with HTTP 200, the
+    # elements it had so far and a "remark"; a partial toll list is not usable
+    if data.get("remark"):
+        raise ValueError(f"Overpass result incomplete: {data['remark']}")
+    elements = data.get("elements", [])
+    coords = np.array(
+        [(el["lat"], el["lon"]) for el in elements if el.get("type") == "node"],
+        dtype=np.float64,
+    )
+    return coords.reshape(-1, 2)
+
+async def fetch_tolls_along_route(polyline):
+    """Toll [lat, lng] coordinates in the route's bounding box.
+
+    Also returns whether the list is complete: a failed live Overpass query
+    gives no tolls and False, so the caller knows not to cache the result.
+    """
+    min_lat, min_lng = polyline.min(axis=0)
+    max_lat, max_lng = polyline.max(axis=0)
+    bbox = (min_lat, min_lng, max_lat, max_lng)
+
+    index = app.state.toll_index
+    if index is not None and index.covers(bbox):
+        return index.query(bbox), True
+
+    try:
+        async with app.state.http.post(OVERPASS, data=overpass_toll_query(bbox)) as r:
+            r.raise_for_status()
+            return parse_toll_coords(await r.read()), True
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        logger.warning("Live Overpass toll query failed", exc_info=True)
+        return np.empty((0, 2), dtype=np.float64), False
+
+def match_tolls(polyline, toll_coords):
+    """Toll points on the route, one per spot.
+
+    CPU-bound; /routes runs it in a worker thread so the event loop stays
+    responsive. Much of it (grid building, dedupe) still holds the GIL.
     """
+    # Shortlist against the decimated route with the threshold widened by the
+    # RDP tolerance (no toll on the full route can be missed), then confirm
+    # the shortlist against the full geometry so the result is exact
+    widened = TOLL_MATCH_THRESHOLD_M + RDP_EPSILON_M
+    segments = build_route_segments(simplify_polyline(polyline), threshold=widened)
+    on_route = tolls_on_route(toll_coords[:, 0], toll_coords[:, 1], segments, threshold=widened)
+    on_route[on_route] = tolls_near_polyline(toll_coords[on_route], polyline)
+    toll_points = []
+    seen = set()
+
+    for lat, lng in toll_coords[on_route].tolist():
+        key = (round(lat, 5), round(lng, 5))
+        if key in seen:
+            continue
+        seen.add(key)
+
+        toll_points.append({
+            "lat": lat,
+            "lng": lng
+        })
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(OVERPASS, data=query)
-        return r.json().get("elements", [])
+    # Dedupe before geocoding so dropped tolls never hit Nominatim
+    return dedupe_nearby_tolls(toll_points, threshold_m=300)
+
+# ================= TOLL INDEX =================
+class TollIndex:
+    """Toll coordinates sorted by latitude for fast bounding-box lookups."""
+
+    def __init__(self, region, coords):
+        self.region = region
+        self.coords = coords[np.argsort(coords[:, 0], kind="stable")]
+        self.lats = np.ascontiguousarray(self.coords[:, 0])
+        self.lngs = np.ascontiguousarray(self.coords[:, 1])
+
+    def covers(self, bbox):
+        s, w, n, e = self.region
+        return s <= bbox[0] and w <= bbox[1] and bbox[2] <= n and bbox[3] <= e
+
+    def query(self, bbox):
+        min_lat, min_lng, max_lat, max_lng = bbox
+        lo = np.searchsorted(self.lats, min_lat, side="left")
+        hi = np.searchsorted(self.lats, max_lat, side="right")
+        lngs = self.lngs[lo:hi]
+        return self.coords[lo:hi][(lngs >= min_lng) & (lngs <= max_lng)]
+
+async def load_toll_index():
+    query = overpass_toll_query(TOLL_REGION, timeout=300)
+    async with app.state.http.post(
+        OVERPASS, data=query, timeout=aiohttp.ClientTimeout(total=360)
+    ) as r:
+        r.raise_for_status()
+        coords = parse_toll_coords(await r.read())
+    return TollIndex(TOLL_REGION, coords)
+
+async def refresh_toll_index():
+    while True:
+        try:
+            index = await load_toll_index()
+            current = app.state.toll_index
+            floor = TOLL_MIN_RELOAD_RATIO * len(current.coords) if current is not None else 0
+            if not len(index.coords) or len(index.coords) < floor:
+                logger.warning(
+                    "Rejected toll index with %d nodes; keeping the last good one",
+                    len(index.coords),
+                )
+                delay = TOLL_RETRY_SECONDS
+            else:
+                app.state.toll_index = index
+                logger.info("Loaded %d toll nodes", len(index.coords))
+                delay = TOLL_REFRESH_SECONDS
+        except Exception:
+            logger.exception("Toll index refresh failed; keeping the last good one")
+            delay = TOLL_RETRY_SECONDS
+        await asyncio.sleep(delay)
 
 # ================= GEOCODE =================
 @app.get("/geocode")
 async def geocode(query: str):
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(
-            f"{NOMINATIM}/search",
-            params={"q": query, "format": "json", "limit": 1},
-            headers=HEADERS
-        )
-        data = r.json()
-        if not data:
-            return {}
-        return {
-            "lat": float(data[0]["lat"]),
-            "lng": float(data[0]["lon"]),
-            "address": data[0]["display_name"]
-        }
+    await NOMINATIM_SPACER.wait()
+    async with app.state.http.get(
+        f"{NOMINATIM}/search",
+        params={"q": query, "format": "json", "limit": 1},
+        timeout=aiohttp.ClientTimeout(total=15)
+    ) as r:
+        data = orjson.loads(await r.read())
+    if not data:
+        return {}
+    return {
+        "lat": float(data[0]["lat"]),
+        "lng": float(data[0]["lon"]),
+        "address": data[0]["display_name"]
+    }
 
 # ================= ROUTES =================
+class OsrmRoute(NamedTuple):
+    polyline: np.ndarray  # (n, 2) float64 [lat, lng]
+    distance: float  # metres
+    duration: float  # seconds
+
+def endpoints_key(start: LatLng, end: LatLng):
+    return (round(start.lat, 4), round(start.lng, 4), round(end.lat, 4), round(end.lng, 4))
+
+async def fetch_route(start: LatLng, end: LatLng):
+    key = endpoints_key(start, end)
+    cached = OSRM_ROUTE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    coords = f"{start.lng},{start.lat};{end.lng},{end.lat}"
+    async with app.state.http.get(
+        f"{OSRM}/route/v1/driving/{coords}",
+        params={"overview": "full", "geometries": "geojson"},
+        timeout=aiohttp.ClientTimeout(total=20)
+    ) as r:
+        data = orjson.loads(await r.read())
+    if "routes" not in data or not data["routes"]:
+        raise HTTPException(500, "No route found")
+
+    route = data["routes"][0]
+    # OSRM gives [lng, lat]; flip the columns once instead of per coordinate,
+    # and keep only the compact array rather than the decoded lists
+    polyline = np.array(route["geometry"]["coordinates"], dtype=np.float64)
+    route = OsrmRoute(
+        np.ascontiguousarray(polyline[:, ::-1]), route["distance"], route["duration"]
+    )
+    OSRM_ROUTE_CACHE.set(key, route)
+    return route
+
+def with_request_echo(response, payload: RouteRequest):
+    """Echo the caller's exact endpoints and vehicle on a cached response."""
+    return {
+        **response,
+        "quantum": {**response["quantum"], "vehicle": payload.vehicle},
+        "start": {**response["start"], "lat": payload.start.lat, "lng": payload.start.lng},
+        "end": {**response["end"], "lat": payload.end.lat, "lng": payload.end.lng},
+    }
+
 @app.post("/routes")
 async def routes(payload: RouteRequest):
-    coords = f"{payload.start.lng},{payload.start.lat};{payload.end.lng},{payload.end.lat}"
+    # estimate_mileage ignores case, so "Van" and "van" share an entry
+    vehicle_key = payload.vehicle.lower()
+    cache_key = (*endpoints_key(payload.start, payload.end), vehicle_key, payload.cc)
+    cached = ROUTE_RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(with_request_echo(cached, payload))
 
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(
-            f"{OSRM}/route/v1/driving/{coords}",
-            params={"overview": "full", "geometries": "geojson"},
-            headers=HEADERS
-        )
-        data = r.json()
-        if "routes" not in data or not data["routes"]:
-            raise HTTPException(500, "No route found")
+    route = await fetch_route(payload.start, payload.end)
 
-        route = data["routes"][0]
+    polyline = route.polyline
+    distance_km = round(route.distance / 1000, 1)
 
-    polyline = [[lat, lon] for lon, lat in route["geometry"]["coordinates"]]
-    distance_km = round(route["distance"] / 1000, 1)
-
-    mins = int(route["duration"] / 60)
+    mins = int(route.duration / 60)
     eta = f"{mins // 60}h {mins % 60}m"
 
     # ===== Fuel Calculation =====
-    # Extract number from "1500 CC", "7000 CC", etc.
-    try:
-        cc_match = re.search(r"\d+", payload.cc)
-        cc_int = int(cc_match.group()) if cc_match else 4000
-    except:
-        cc_int = 4000
-
-    start_addr = await reverse_geocode(payload.start.lat, payload.start.lng)
-    end_addr = await reverse_geocode(payload.end.lat, payload.end.lng)
+    start_addr, end_addr = await asyncio.gather(
+        reverse_geocode(payload.start.lat, payload.start.lng),
+        reverse_geocode(payload.end.lat, payload.end.lng),
+    )
 
     city = extract_city(start_addr)
     fuel_price = CITY_FUEL_PRICES.get(city, DEFAULT_FUEL_PRICE)
 
-    mileage = estimate_mileage(payload.vehicle, cc_int)
+    mileage = estimate_mileage(payload.vehicle, payload.cc)
 
     fuel_used_liters = round(distance_km / mileage, 2)
     fuel_cost = round(fuel_used_liters * fuel_price, 2)
 
     # ===== TOLLS =====
-    raw_tolls = await fetch_tolls_along_route(polyline)
-    toll_points = []
-    seen = set()
+    toll_coords, tolls_complete = await fetch_tolls_along_route(polyline)
+    # The geometry phase is CPU-bound, so keep it off the event loop
+    toll_points = await asyncio.to_thread(match_tolls, polyline, toll_coords)
 
-    for t in raw_tolls:
-        lat = t["lat"]
-        lng = t["lon"]
+    addresses = await asyncio.gather(
+        *(reverse_geocode(p["lat"], p["lng"]) for p in toll_points)
+    )
+    for p, address in zip(toll_points, addresses):
+        p["address"] = address
 
-        if not is_toll_on_route(lat, lng, polyline):
-            continue
-
-        key = (round(lat, 5), round(lng, 5))
-        if key in seen:
-            continue
-        seen.add(key)
-
-        address = await reverse_geocode(lat, lng)
-
-        toll_points.append({
-            "lat": lat,
-            "lng": lng,
-            "address": address
-        })
-
-    toll_points = dedupe_nearby_tolls(toll_points, threshold_m=300)
-
-    return {
+    response = {
         "quantum": {
             "polyline": polyline,
             "distance_km": distance_km,
@@ -260,7 +707,7 @@ async def routes(payload: RouteRequest):
             "fuel_price_per_liter": fuel_price,
             "mileage_used": mileage,
             "vehicle": payload.vehicle,
-            "cc": cc_int,
+            "cc": payload.cc,
             "city": city or "Unknown"
         },
         "start": {
@@ -276,3 +723,8 @@ async def routes(payload: RouteRequest):
         "toll_count": len(toll_points),
         "toll_points": toll_points
     }
+    # Like the geocode cache, don't keep a response built on a failed lookup
+    if tolls_complete and UNKNOWN_LOCATION not in (start_addr, end_addr, *addresses):
+        ROUTE_RESPONSE_CACHE.set(cache_key, response)
+    # Returned as a Response so the polyline array skips jsonable_encoder
+    return ORJSONResponse(response)